@@ -0,0 +1,141 @@
+# date_utils.py (pure date/slot parsing helpers used by main.py)
+#
+# Kept free of I/O and fully annotated so it can optionally be compiled
+# with mypyc (`mypyc date_utils.py`); the resulting extension module is
+# picked up by `from date_utils import ...` in place of this file.
+
+from datetime import date, time, timedelta
+from functools import lru_cache
+import re
+
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+WEEKDAY_IDX = {name.lower(): i for i, name in enumerate(WEEKDAY_NAMES)}
+
+# ---------------------------------------------------------------------
+# UTILITIES
+# ---------------------------------------------------------------------
+def next_weekday_date(target_weekday: int, from_date: date | None = None) -> date:
+    if from_date is None:
+        from_date = date.today()
+    days_ahead = (target_weekday - from_date.weekday() + 7) % 7
+    return from_date if days_ahead == 0 else from_date + timedelta(days=days_ahead)
+
+
+# Input shapes, classified once by regex and dispatched to a single parser
+_ISO_RE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")                 # 2025-12-03, 2025-1-3
+_DMY_RE = re.compile(r"^(\d{1,2})\s+([A-Za-z]{3,9})\s+(\d{4})$")          # 03 December 2025
+_MDY_RE = re.compile(r"^([A-Za-z]{3,9})\s+(\d{1,2}),?\s+(\d{4})$")        # Dec 3, 2025
+
+_MONTH_NAMES = (
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+)
+# full and three-letter names -> month number
+_MONTH_IDX = {
+    **{name: i for i, name in enumerate(_MONTH_NAMES, 1)},
+    **{name[:3]: i for i, name in enumerate(_MONTH_NAMES, 1)},
+}
+
+
+def _build_date(year: str, month: int | None, day: str) -> date | None:
+    if month is None:
+        return None
+    try:
+        return date(int(year), month, int(day))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=256)
+def _parse_calendar_date(s: str) -> date | None:
+    """Parse an explicit calendar date (no weekday names). Pure, so memoized."""
+    m = _ISO_RE.match(s)
+    if m:
+        return _build_date(m.group(1), int(m.group(2)), m.group(3))
+
+    m = _DMY_RE.match(s)
+    if m:
+        return _build_date(m.group(3), _MONTH_IDX.get(m.group(2).lower()), m.group(1))
+
+    m = _MDY_RE.match(s)
+    if m:
+        return _build_date(m.group(3), _MONTH_IDX.get(m.group(1).lower()), m.group(2))
+
+    return None
+
+
+def parse_day_to_date(day_str: str) -> date | None:
+    """Try multiple date formats and weekday names. Accepts:
+       - ISO: YYYY-MM-DD
+       - Day-first: 03 December 2025
+       - Month-first: December 03 2025 (user input)
+       - Short month: Dec 03 2025 or Dec 3 2025
+       - Weekday name: 'wednesday' -> returns next Wednesday (including today)
+    """
+    if not day_str:
+        return None
+
+    s = day_str.strip()
+
+    # weekday names first: the most common spoken input, and they depend on
+    # today so they are resolved outside the cache
+    weekday = WEEKDAY_IDX.get(s.lower())
+    if weekday is not None:
+        return next_weekday_date(weekday)
+
+    return _parse_calendar_date(s)
+
+
+def format_db_date(d: date) -> str:
+    """MM/DD/YY as stored in the appointments table (int formatting, no strftime)."""
+    return f"{d.month:02d}/{d.day:02d}/{d.year % 100:02d}"
+
+
+# "10:00 AM - 11:00 AM", "4 PM", "4:30pm" (end side optional)
+_SLOT_RE = re.compile(
+    r"^\s*(\d{1,2})(?::(\d{2}))?\s*([ap]m)(?:\s*-\s*(\d{1,2})(?::(\d{2}))?\s*([ap]m))?\s*$",
+    re.IGNORECASE,
+)
+# 24-hour fallback: "16:00" or "16"
+_SLOT_24H_RE = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*$")
+
+
+def _clock_time(hour: str, minute: str | None, meridiem: str) -> time | None:
+    h = int(hour)
+    m = int(minute) if minute else 0
+    if not 1 <= h <= 12 or m > 59:
+        return None
+    return time(h % 12 + (12 if meridiem[0] in "pP" else 0), m)
+
+
+def parse_slot_times(slot_str: str) -> tuple[time, time] | None:
+    """
+    Robust slot parsing.
+    - Accepts "10:00 AM - 11:00 AM"
+    - Accepts "4 PM" or "4:00 PM" and converts to 4:00-5:00
+    - Returns (start_time, end_time) or None if parsing fails
+    """
+    if not slot_str:
+        return None
+
+    match = _SLOT_RE.match(slot_str)
+    if match:
+        sh, sm, sp, eh, em, ep = match.groups()
+        start = _clock_time(sh, sm, sp)
+        if start is None:
+            return None
+        # Single time like "4 PM" → one-hour slot
+        if eh is None:
+            return start, time((start.hour + 1) % 24, start.minute)
+        end = _clock_time(eh, em, ep)
+        return (start, end) if end is not None else None
+
+    # fallback: try 24-hour format "16:00"
+    match = _SLOT_24H_RE.match(slot_str)
+    if match:
+        h = int(match.group(1))
+        m = int(match.group(2) or 0)
+        if h <= 23 and m <= 59:
+            return time(h, m), time((h + 1) % 24, m)
+
+    return None
@@ -4,12 +4,34 @@ from dotenv import load_dotenv
 from livekit import agents
 from livekit.agents import Agent, AgentSession, RunContext
 from livekit.agents.llm import function_tool
-from livekit.plugins import silero, google, elevenlabs, deepgram
-from datetime import datetime, date, timedelta, time
+# LiveKit registers plugins on import and requires the main thread, so these
+# stay at module scope; only the plugins the session actually uses are loaded.
+from livekit.plugins import silero, google, deepgram
+from livekit.plugins.turn_detector.multilingual import MultilingualModel
+from datetime import datetime
 from zoneinfo import ZoneInfo
+from functools import lru_cache
+from cachetools import TTLCache
+import asyncio
+import asyncpg
+import atexit
 import os
+import time
+import httpx
+import orjson
 import requests
-from supabase import create_client
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from supabase import Client, ClientOptions, create_client
+from postgrest.exceptions import APIError
+
+from date_utils import (
+    WEEKDAY_IDX,
+    WEEKDAY_NAMES,
+    format_db_date,
+    parse_day_to_date,
+    parse_slot_times,
+)
 
 
 # ✅ Langfuse OFFICIAL SDK (NO OpenTelemetry)
@@ -19,11 +41,32 @@ load_dotenv(".env")
 # ---------------------------------------------------------------------
 # ✅ Langfuse OFFICIAL Initialization
 # ---------------------------------------------------------------------
-langfuse = Langfuse(
-    public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
-    secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
-    host=os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com"),
-)
+# LF_TRACE: "writes" (default) traces booking/cancel paths only,
+# "all" also traces read-only tools, "off" disables @observe entirely.
+LF_TRACE = os.getenv("LF_TRACE", "writes").lower()
+
+
+def _no_observe(**kwargs):
+    return lambda fn: fn
+
+
+# Without credentials, skip the client (and its background flush thread) entirely
+if os.getenv("LANGFUSE_PUBLIC_KEY") and os.getenv("LANGFUSE_SECRET_KEY"):
+    langfuse = Langfuse(
+        public_key=os.getenv("LANGFUSE_PUBLIC_KEY"),
+        secret_key=os.getenv("LANGFUSE_SECRET_KEY"),
+        host=os.getenv("LANGFUSE_HOST", "https://cloud.langfuse.com"),
+        # batch spans instead of flushing on every traced call
+        flush_at=int(os.getenv("LANGFUSE_FLUSH_AT", "50")),
+        flush_interval=float(os.getenv("LANGFUSE_FLUSH_INTERVAL", "5")),
+    )
+    atexit.register(langfuse.flush)
+else:
+    langfuse = None
+    LF_TRACE = "off"
+
+_observe = observe if LF_TRACE != "off" else _no_observe
+_observe_reads = observe if LF_TRACE == "all" else _no_observe
 
 # ---------------------------------------------------------------------
 # SUPABASE
@@ -33,115 +76,98 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise RuntimeError("Missing SUPABASE_URL or SUPABASE_KEY in environment")
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """Process-wide Supabase client; its PostgREST httpx session keeps
+    connections alive, so every query after the first skips the TLS handshake."""
+    return create_client(
+        SUPABASE_URL,
+        SUPABASE_KEY,
+        options=ClientOptions(postgrest_client_timeout=5),
+    )
+
+
+async def _db_exec(query):
+    """Run a blocking supabase-py query in a worker thread, off the event loop."""
+    return await asyncio.to_thread(query.execute)
+
+
+# Request-builder factory for the one table we use; each .select()/.insert()/...
+# call on it returns a fresh query, so it is safe to share.
+_APPT_TABLE = get_supabase_client().table("appointments")
+
+# Optional direct Postgres URL (direct host or session-mode pooler: asyncpg
+# prepares statements, which transaction-mode pgbouncer can't hold). When set,
+# the hot booking queries skip PostgREST; everything else stays on REST.
+SUPABASE_DB_URL = os.getenv("SUPABASE_DB_URL")
+PG_CONNECT_TIMEOUT = 3.0  # seconds; asyncpg's default (60 s) would stall the voice turn
+PG_COMMAND_TIMEOUT = 3.0  # seconds per query; a hung pooled connection can't stall a turn
+PG_RETRY_AFTER = 60.0  # seconds to stay on REST after a failed pool creation
+# Errors that mean the direct Postgres path failed; callers fall back to REST
+_PG_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+# Subset where the connection itself broke (vs. the query failing server-side)
+_PG_CONNECTION_ERRORS = (
+    asyncpg.PostgresConnectionError, asyncpg.InterfaceError, OSError, asyncio.TimeoutError,
+)
+_pg_pool: asyncpg.Pool | None = None
+_pg_pool_retry_at = 0.0  # time.monotonic() before which we don't try to connect again
+_pg_pool_lock = asyncio.Lock()
+
+
+async def get_pg_pool() -> asyncpg.Pool | None:
+    """Shared asyncpg pool, created on first use; None if not configured or unreachable."""
+    global _pg_pool, _pg_pool_retry_at
+    if _pg_pool is None and SUPABASE_DB_URL and time.monotonic() >= _pg_pool_retry_at:
+        async with _pg_pool_lock:
+            if _pg_pool is None and time.monotonic() >= _pg_pool_retry_at:
+                try:
+                    _pg_pool = await asyncpg.create_pool(
+                        SUPABASE_DB_URL,
+                        min_size=2,
+                        max_size=10,
+                        statement_cache_size=100,
+                        timeout=PG_CONNECT_TIMEOUT,
+                        command_timeout=PG_COMMAND_TIMEOUT,
+                    )
+                except (*_PG_ERRORS, ValueError) as e:
+                    # Remember the failure so every tool call doesn't retry the connect
+                    _pg_pool_retry_at = time.monotonic() + PG_RETRY_AFTER
+                    print("⚠️ Postgres pool unavailable, using REST:", e)
+    return _pg_pool
+
 
 GOOGLE_MCP_URL = os.getenv("GOOGLE_MCP_URL", "http://localhost:5000/create-event")
+GOOGLE_MCP_DELETE_URL = os.getenv(
+    "GOOGLE_MCP_DELETE_URL", GOOGLE_MCP_URL.rsplit("/", 1)[0] + "/delete-event"
+)
+# (connect, read) seconds. Calendar calls run in the background, so a slow
+# response costs no voice latency; a short read timeout would only abandon a
+# create that still succeeds server-side (e.g. after an inline token refresh),
+# leaving an event whose id is never stored and can't be deleted on cancel.
+MCP_TIMEOUT = (1.0, 8.0)
 TIMEZONE = ZoneInfo("Asia/Karachi")
 
-# ---------------------------------------------------------------------
-# UTILITIES
-# ---------------------------------------------------------------------
-def next_weekday_date(target_weekday: int, from_date: date = None) -> date:
-    if from_date is None:
-        from_date = date.today()
-    days_ahead = (target_weekday - from_date.weekday() + 7) % 7
-    return from_date if days_ahead == 0 else from_date + timedelta(days=days_ahead)
-
-
-def parse_day_to_date(day_str: str) -> date | None:
-    """Try multiple date formats and weekday names. Accepts:
-       - ISO: YYYY-MM-DD
-       - Day-first: 03 December 2025
-       - Month-first: December 03 2025 (user input)
-       - Short month: Dec 03 2025 or Dec 3 2025
-       - Weekday name: 'wednesday' -> returns next Wednesday (including today)
-    """
-    if not day_str:
-        return None
-
-    s = day_str.strip()
-    # common formats to try (cover month-first and day-first)
-    formats = [
-        "%Y-%m-%d",
-        "%d %B %Y",   # 03 December 2025
-        "%d %b %Y",   # 03 Dec 2025
-        "%B %d %Y",   # December 03 2025
-        "%b %d %Y",   # Dec 03 2025
-        "%B %d, %Y",  # December 3, 2025
-        "%b %d, %Y",
-    ]
-    for fmt in formats:
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            pass
+SHOW_APPOINTMENTS_LIMIT = 50
 
-    # try flexible parsing of "December 3 2025" without leading zero
-    for fmt in ("%B %d %Y", "%b %d %Y"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except Exception:
-            pass
-
-    # weekday names
-    s_lower = s.lower()
-    weekdays = {
-        "monday": 0, "tuesday": 1, "wednesday": 2,
-        "thursday": 3, "friday": 4, "saturday": 5, "sunday": 6
-    }
-    if s_lower in weekdays:
-        return next_weekday_date(weekdays[s_lower])
-
-    return None
-
-
-def parse_slot_times(slot_str: str) -> tuple[time, time] | None:
-    """
-    Robust slot parsing.
-    - Accepts "10:00 AM - 11:00 AM"
-    - Accepts "4 PM" or "4:00 PM" and converts to 4:00-5:00
-    - Returns (start_time, end_time) or None if parsing fails
-    """
-    if not slot_str:
-        return None
-
-    s = slot_str.strip()
-    # If it's a range like "10:00 AM - 11:00 AM"
-    if "-" in s:
-        parts = s.split("-")
-        if len(parts) != 2:
-            return None
-        start_raw = parts[0].strip()
-        end_raw = parts[1].strip()
-        for fmt in ("%I:%M %p", "%I %p"):
-            try:
-                start_dt = datetime.strptime(start_raw, fmt)
-                end_dt = datetime.strptime(end_raw, fmt)
-                return start_dt.time(), end_dt.time()
-            except Exception:
-                pass
-        return None
-
-    # Single time like "4 PM" or "4:00 PM"
-    for fmt in ("%I:%M %p", "%I %p"):
-        try:
-            start_dt = datetime.strptime(s, fmt)
-            end_dt = start_dt + timedelta(hours=1)
-            return start_dt.time(), end_dt.time()
-        except Exception:
-            pass
-
-    # fallback: try 24-hour format "16:00"
-    for fmt in ("%H:%M", "%H"):
-        try:
-            start_dt = datetime.strptime(s, fmt)
-            end_dt = start_dt + timedelta(hours=1)
-            return start_dt.time(), end_dt.time()
-        except Exception:
-            pass
+# Returned by _insert_appointment_db when the (date, slot) is already booked
+SLOT_TAKEN = object()
 
-    return None
+# Spoken "now" string, re-formatted only when the minute changes
+_now_cache = {"minute": None, "text": ""}
 
+# ---------------------------------------------------------------------
+# HTTP (shared keep-alive session for the Google MCP server)
+# ---------------------------------------------------------------------
+_http = requests.Session()
+_http_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=10,
+    max_retries=Retry(total=2, backoff_factor=0.2),
+)
+_http.mount("http://", _http_adapter)
+_http.mount("https://", _http_adapter)
+_JSON_HEADERS = {"Content-Type": "application/json"}
 
 # ---------------------------------------------------------------------
 # AGENT
@@ -149,18 +175,48 @@ def parse_slot_times(slot_str: str) -> tuple[time, time] | None:
 class DoctorReceptionist(Agent):
 
     def __init__(self):
-        super().__init__(instructions="You are a friendly and professional voice receptionist for a doctor's clinic.")
+        super().__init__(
+            instructions=(
+                "You are a friendly and professional voice receptionist for a doctor's clinic. "
+                "Use list_available_slots to check the doctor's availability and free times "
+                "for a city and day before booking. Use get_current_date_and_time to resolve "
+                "relative days like 'tomorrow' into a date."
+            )
+        )
 
         self.time_slots = [
             "10:00 AM - 11:00 AM", "11:00 AM - 12:00 PM", "12:00 PM - 01:00 PM",
             "01:00 PM - 02:00 PM", "04:00 PM - 05:00 PM", "05:00 PM - 06:00 PM",
             "06:00 PM - 07:00 PM", "07:00 PM - 08:00 PM",
         ]
+        # Pre-parsed (start, end) per slot label, plus a case-insensitive view
+        self._slot_times = {s: parse_slot_times(s) for s in self.time_slots}
+        self._slot_times_ci = {s.lower(): v for s, v in self._slot_times.items()}
+        # (start, end) -> canonical label, so known slots skip strftime
+        self._slot_by_times = {v: s for s, v in self._slot_times.items()}
+        self._slots_csv = ", ".join(self.time_slots)
 
         self.schedule = {
             "sialkot": ["monday", "tuesday", "wednesday"],
             "lahore": ["thursday", "friday", "saturday"],
         }
+        # Display names per city key, so tools don't re-title() on every call
+        self._city_title = {c: c.title() for c in self.schedule}
+        # city -> 7-bit weekday mask (bit 0 = Monday), e.g. sialkot = 0b0000111
+        self._schedule_mask = {
+            c: sum(1 << WEEKDAY_IDX[d] for d in days) for c, days in self.schedule.items()
+        }
+        # weekday index -> branch the doctor is at, for "try the other city" hints
+        self._city_on_weekday = {
+            WEEKDAY_IDX[d]: self._city_title[c] for c, days in self.schedule.items() for d in days
+        }
+        # Canned off-day replies for every (city, weekday) the doctor isn't there
+        self._unavailable_replies = {
+            (c, wd): self._unavailable_reply(self._city_title[c], wd)
+            for c, mask in self._schedule_mask.items()
+            for wd in range(7)
+            if not mask & (1 << wd)
+        }
 
         self.doctor = {
             "name": "Dr. Sarah Khan",
@@ -168,53 +224,191 @@ class DoctorReceptionist(Agent):
             "fee": 2500,
         }
 
-        self.appointments = []
-        self._load_appointments_from_db()
+        # MM/DD/YY -> booked slot labels (lowercased). Callers re-ask about the
+        # same day while negotiating a slot, so keep answers briefly; bookings
+        # and cancellations invalidate their date.
+        self._slots_cache: TTLCache = TTLCache(maxsize=64, ttl=15)
+
+        # Strong refs to in-flight calendar syncs so they aren't GC'd mid-run
+        self._background_tasks: set[asyncio.Task] = set()
 
     # -----------------------------------------------------------------
-    @observe(name="supabase_load_appointments")
-    def _load_appointments_from_db(self):
-        try:
-            res = supabase.table("appointments").select("*").execute()
-            self.appointments = res.data if res.data else []
-        except:
-            self.appointments = []
+    @_observe_reads(name="supabase_booked_slots")
+    async def _booked_slots(self, date_str: str) -> set[str]:
+        """Booked slot labels (lowercased) for a MM/DD/YY date, TTL-cached."""
+        booked = self._slots_cache.get(date_str)
+        if booked is None:
+            rows = None
+            pool = await get_pg_pool()
+            if pool is not None:
+                try:
+                    rows = await pool.fetch("SELECT slot FROM appointments WHERE date = $1", date_str)
+                except _PG_ERRORS as e:
+                    print("⚠️ Postgres slot lookup failed, using REST:", e)
+            if rows is None:
+                rows = (await _db_exec(_APPT_TABLE.select("slot").eq("date", date_str))).data or []
+            booked = {r["slot"].lower() for r in rows}
+            self._slots_cache[date_str] = booked
+        return booked
 
     # -----------------------------------------------------------------
-    @observe(name="supabase_insert_appointment")
-    def _insert_appointment_db(self, appointment: dict) -> dict | None:
-        """Insert appointment into Supabase and return the inserted record."""
+    @_observe(name="supabase_insert_appointment")
+    def _insert_appointment_db(self, appointment: dict) -> dict | object | None:
+        """Book through the book_appointment RPC and return the inserted record.
+
+        Returns SLOT_TAKEN if (date, slot) is already booked; the conflict
+        check and insert happen atomically in one round-trip.
+        """
         try:
-            response = supabase.table("appointments").insert(appointment).execute()
+            response = get_supabase_client().rpc("book_appointment", {
+                "p_patient_name": appointment["patient_name"],
+                "p_city": appointment["city"],
+                "p_date": appointment["date"],
+                "p_slot": appointment["slot"],
+                "p_notes": appointment["notes"],
+            }).execute()
             if response.data and len(response.data) > 0:
                 return response.data[0]
-            return None
-        except Exception as e:
+            return SLOT_TAKEN
+        except (APIError, httpx.HTTPError) as e:
             print("❌ Supabase insert error:", e)
             return None
 
     # -----------------------------------------------------------------
-    @function_tool
-    @observe(name="check_availability")
-    async def check_availability(self, context: RunContext, city: str, day: str) -> str:
+    async def _book_appointment_db(self, appointment: dict) -> dict | object | None:
+        """Call the book_appointment RPC over the asyncpg pool when configured,
+        else through PostgREST in a worker thread. Same returns as
+        _insert_appointment_db."""
+        pool = await get_pg_pool()
+        if pool is None:
+            return await asyncio.to_thread(self._insert_appointment_db, appointment)
 
-        city = city.lower().strip()
-        day_in = day.lower().strip()
+        try:
+            row = await pool.fetchrow(
+                "SELECT * FROM book_appointment($1, $2, $3, $4, $5)",
+                appointment["patient_name"],
+                appointment["city"],
+                appointment["date"],
+                appointment["slot"],
+                appointment["notes"],
+            )
+        except _PG_CONNECTION_ERRORS as e:
+            # Connection-level failure: retry through the REST RPC. Safe to repeat,
+            # since ON CONFLICT (date, slot) DO NOTHING can't double-book the slot.
+            print("⚠️ Postgres booking failed, retrying via REST:", e)
+            return await asyncio.to_thread(self._insert_appointment_db, appointment)
+        except asyncpg.PostgresError as e:
+            print("❌ Postgres booking error:", e)
+            return None
+        return dict(row) if row is not None else SLOT_TAKEN
 
-        if day_in == "sunday":
-            return "Doctor is on leave on Sunday."
+    # -----------------------------------------------------------------
+    @_observe(name="google_calendar_sync")
+    def _sync_to_calendar(self, appointment_id: str, event_payload: dict) -> None:
+        """Create the Google Calendar event and store its link/id on the row.
 
-        if city not in self.schedule:
+        Runs in a worker thread via asyncio.to_thread so the booking
+        confirmation is not held up by the MCP server round-trip.
+        """
+        try:
+            resp = _http.post(
+                GOOGLE_MCP_URL, data=orjson.dumps(event_payload), headers=_JSON_HEADERS, timeout=MCP_TIMEOUT
+            )
+            if not resp.ok:
+                print("Calendar sync failed:", resp.status_code, resp.text)
+                return
+            data = orjson.loads(resp.content)
+        except (requests.RequestException, orjson.JSONDecodeError) as e:
+            print("⚠️ Calendar sync failed:", str(e))
+            return
+
+        # ✅ Store whichever of htmlLink / eventId the MCP server returned, in one update
+        patch = {}
+        if "htmlLink" in data:
+            patch["calendar_link"] = data["htmlLink"]
+        if "eventId" in data:
+            patch["calendar_event_id"] = data["eventId"]
+        if patch:
+            try:
+                _APPT_TABLE.update(patch).eq("id", appointment_id).execute()
+            except (APIError, httpx.HTTPError) as e:
+                print("⚠️ Saving calendar link failed:", str(e))
+
+    # -----------------------------------------------------------------
+    @_observe(name="google_calendar_delete")
+    def _delete_calendar_event(self, event_id: str) -> None:
+        """Remove a cancelled appointment's Google Calendar event (worker thread)."""
+        try:
+            resp = _http.post(
+                GOOGLE_MCP_DELETE_URL,
+                data=orjson.dumps({"eventId": event_id}),
+                headers=_JSON_HEADERS,
+                timeout=MCP_TIMEOUT,
+            )
+            if not resp.ok:
+                print("Calendar delete failed:", resp.status_code, resp.text)
+        except requests.RequestException as e:
+            print("⚠️ Calendar delete failed:", str(e))
+
+    def _unavailable_reply(self, city_title: str, wd: int) -> str:
+        other = self._city_on_weekday.get(wd)
+        if other is None:
+            return f"Doctor is on leave on {WEEKDAY_NAMES[wd]}."
+        return (
+            f"Doctor is not available in {city_title} on {WEEKDAY_NAMES[wd]}."
+            f" The doctor is in {other} on {WEEKDAY_NAMES[wd]}."
+        )
+
+    def _run_in_background(self, fn, *args) -> None:
+        """Run a blocking helper in a thread without holding up the voice turn."""
+        task = asyncio.create_task(asyncio.to_thread(fn, *args))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    # -----------------------------------------------------------------
+    @function_tool
+    @_observe_reads(name="get_current_date_and_time")
+    async def get_current_date_and_time(self, context: RunContext) -> str:
+        now = datetime.now(TIMEZONE)
+        minute = (now.year, now.month, now.day, now.hour, now.minute)
+        if _now_cache["minute"] != minute:
+            _now_cache["minute"] = minute
+            _now_cache["text"] = now.strftime("%A, %B %d, %Y at %I:%M %p")
+        return f"The current date and time is {_now_cache['text']}."
+
+    # -----------------------------------------------------------------
+    @function_tool
+    @_observe_reads(name="list_available_slots")
+    async def list_available_slots(self, context: RunContext, city: str, day: str) -> str:
+        city = city.strip().lower()
+
+        mask = self._schedule_mask.get(city)
+        if mask is None:
             return "Services only available in Sialkot and Lahore."
+        city_title = self._city_title[city]
+
+        booking_date = parse_day_to_date(day)
+        if not booking_date:
+            return "❌ Invalid date provided. Please say the full date like 'December 3 2025'."
+
+        wd = booking_date.weekday()
+        if not mask & (1 << wd):
+            return self._unavailable_replies[(city, wd)]
 
-        if day_in in self.schedule[city]:
-            return f"Doctor is available in {city.title()} on {day_in.title()}."
+        date_str = format_db_date(booking_date)
+        booked = await self._booked_slots(date_str)
+        if not booked:
+            free_csv = self._slots_csv
+        else:
+            free_csv = ", ".join(s for s in self.time_slots if s.lower() not in booked)
+            if not free_csv:
+                return f"All slots are booked in {city_title} on {WEEKDAY_NAMES[wd]} {date_str}."
 
-        return "Doctor not available."
+        return f"Available slots in {city_title} on {WEEKDAY_NAMES[wd]} {date_str}: {free_csv}."
 
     # -----------------------------------------------------------------
     @function_tool
-    @observe(name="book_appointment")
+    @_observe(name="book_appointment")
     async def book_appointment(
         self,
         context: RunContext,
@@ -226,99 +420,77 @@ class DoctorReceptionist(Agent):
     ) -> str:
 
         try:
-            # ✅ Normalize inputs
-            city = city.lower().strip()
-            slot_input = slot.lower().replace(" ", "")  # converts "4 pm" → "4pm"
-
-            # ✅ Fix slot like "4pm" → "4 PM"
-            if slot_input.endswith("pm") or slot_input.endswith("am"):
-                num = slot_input[:-2]
-                slot_input = f"{num} {slot_input[-2:].upper()}"
+            # ✅ Normalize inputs once and reuse below
+            city = city.strip().lower()
+
+            # Cheapest checks first; nothing below touches the network until
+            # the request is known to be valid.
+            mask = self._schedule_mask.get(city)
+            if mask is None:
+                return "❌ Services only available in Sialkot and Lahore."
+            city_title = self._city_title[city]
+
+            # ✅ Parse time safely (canonical slot labels skip parsing entirely).
+            # Free-form input like "4 PM" is accepted only if it resolves to one
+            # of the fixed slots: the (date, slot) unique index can't catch
+            # overlapping off-grid times such as 4:30-5:30 PM.
+            times = self._slot_times_ci.get(slot.strip().lower()) or parse_slot_times(slot)
+            formatted_slot = self._slot_by_times.get(times) if times else None
+            if formatted_slot is None:
+                return f"❌ Invalid time slot. Available slots: {self._slots_csv}."
 
             # ✅ Parse date safely
             booking_date = parse_day_to_date(day)
             if not booking_date:
                 return "❌ Invalid date provided. Please say the full date like 'December 3 2025'."
 
-            # ✅ Parse time safely
-            times = parse_slot_times(slot_input)
-            if not times:
-                return "❌ Invalid time slot. Example: 4 PM or 10:00 AM - 11:00 AM."
+            # ✅ Doctor must be in that city on that weekday
+            wd = booking_date.weekday()
+            if not mask & (1 << wd):
+                return "❌ " + self._unavailable_replies[(city, wd)]
 
-            start_dt = datetime.combine(booking_date, times[0]).replace(tzinfo=TIMEZONE)
-            end_dt = datetime.combine(booking_date, times[1]).replace(tzinfo=TIMEZONE)
+            start_dt = datetime.combine(booking_date, times[0], tzinfo=TIMEZONE)
+            end_dt = datetime.combine(booking_date, times[1], tzinfo=TIMEZONE)
 
-            # ✅ Format slot as "04:00 PM - 05:00 PM" (matching your DB format)
-            formatted_slot = f"{start_dt.strftime('%I:%M %p')} - {end_dt.strftime('%I:%M %p')}"
+            date_str = format_db_date(booking_date)  # ✅ MM/DD/YY format
 
-            # ✅ Prevent duplicate slot booking
-            for appt in self.appointments:
-                if (
-                    appt["city"].lower() == city
-                    and appt["date"] == booking_date.strftime("%m/%d/%y")
-                    and appt["slot"].lower() == formatted_slot.lower()
-                ):
-                    return "❌ This slot is already booked. Please choose another time."
+            # ✅ Recently seen as booked? Skip the insert round-trip (the DB index stays authoritative)
+            if formatted_slot.lower() in self._slots_cache.get(date_str, ()):
+                return "❌ This slot is already booked. Please choose another time."
 
-            # Build appointment dict
+            # Build appointment dict (id / patient_id are generated by Postgres)
+            patient_title = patient_name.title()
             appointment = {
-                "id": f"APT{len(self.appointments) + 1001}",
-                "patient_name": patient_name.title(),
-                "patient_id": f"PID{len(self.appointments) + 5001}",
-                "city": city.title(),
-                "date": booking_date.strftime("%m/%d/%y"),  # ✅ MM/DD/YY format
+                "patient_name": patient_title,
+                "city": city_title,
+                "date": date_str,
                 "slot": formatted_slot,
                 "notes": notes if notes else None,
-                "calendar_event_id": None,
-                "calendar_link": None,
             }
 
             # Persist to Supabase first (to ensure id is reserved)
-            inserted = self._insert_appointment_db(appointment)
+            # ✅ Duplicate slots are skipped atomically by the book_appointment RPC
+            inserted = await self._book_appointment_db(appointment)
+            self._slots_cache.pop(date_str, None)
+            if inserted is SLOT_TAKEN:
+                return "❌ This slot is already booked. Please choose another time."
             if inserted is None:
                 return "❌ Failed to save appointment. Please try again later."
 
-            # Keep local cache synced
-            self._load_appointments_from_db()
 
             # -------------------------------
-            # 📌 SEND TO GOOGLE MCP SERVER
+            # 📌 SEND TO GOOGLE MCP SERVER (background, off the voice turn)
             # -------------------------------
-            try:
-                event_payload = {
-                    "patient_name": patient_name,
-                    "city": appointment["city"],
-                    # Google MCP server expects ISO datetimes like "2025-11-15T10:00:00" and it will add timezone
-                    "start_time": start_dt.isoformat(),
-                    "end_time": end_dt.isoformat(),
-                }
-
-                resp = requests.post(GOOGLE_MCP_URL, json=event_payload, timeout=8)
-                if resp.ok:
-                    try:
-                        data = resp.json()
-                        # ✅ Update with htmlLink and eventId from your MCP server
-                        if "htmlLink" in data:
-                            supabase.table("appointments").update({
-                                "calendar_link": data.get("htmlLink")
-                            }).eq("id", appointment["id"]).execute()
-                            appointment["calendar_link"] = data.get("htmlLink")
-                        
-                        if "eventId" in data:
-                            supabase.table("appointments").update({
-                                "calendar_event_id": data.get("eventId")
-                            }).eq("id", appointment["id"]).execute()
-                            appointment["calendar_event_id"] = data.get("eventId")
-
-                    except Exception as e:
-                        print("Failed parsing MCP response:", e)
-                else:
-                    print("Calendar sync failed:", resp.status_code, resp.text)
-
-            except Exception as e:
-                print("⚠️ Calendar sync failed:", str(e))
-
-            return f"✅ Appointment confirmed for {patient_name.title()} on {booking_date.strftime('%m/%d/%y')} at {formatted_slot} in {city.title()}!"
+            event_payload = {
+                "patient_name": patient_name,
+                "city": appointment["city"],
+                # Google MCP server expects ISO datetimes like "2025-11-15T10:00:00" and it will add timezone
+                "start_time": start_dt.isoformat(),
+                "end_time": end_dt.isoformat(),
+            }
+            self._run_in_background(self._sync_to_calendar, inserted["id"], event_payload)
+
+            return f"✅ Appointment {inserted['id']} confirmed for {patient_title} on {date_str} at {formatted_slot} in {city_title}!"
 
         except Exception as e:
             print("🔥 BOOKING ERROR:", str(e))
@@ -327,44 +499,112 @@ class DoctorReceptionist(Agent):
 
     # -----------------------------------------------------------------
     @function_tool
-    @observe(name="show_appointments")
+    @_observe_reads(name="show_appointments")
     async def show_appointments(self, context: RunContext) -> str:
-        res = supabase.table("appointments").select("*").execute()
+        # Newest first, one page only so the reply stays speakable; fetch one
+        # extra row to know whether there are more
+        res = await _db_exec(
+            _APPT_TABLE
+            .select("id,patient_name,date,slot,city")
+            .order("created_at", desc=True)
+            .range(0, SHOW_APPOINTMENTS_LIMIT)
+        )
         appts = res.data if res.data else []
+        if not appts:
+            return "No appointments."
 
-        return "\n".join([a["id"] for a in appts]) if appts else "No appointments."
+        summary = "Appointments:\n" + "\n".join(
+            f"{a['id']} — {a['patient_name']} on {a['date']} at {a['slot']} ({a['city']})"
+            for a in appts[:SHOW_APPOINTMENTS_LIMIT]
+        )
+        if len(appts) > SHOW_APPOINTMENTS_LIMIT:
+            summary += "\n…and more"
+        return summary
 
     # -----------------------------------------------------------------
     @function_tool
-    @observe(name="cancel_appointment")
+    @_observe(name="cancel_appointment")
     async def cancel_appointment(self, context: RunContext, appointment_id: str = "") -> str:
-        supabase.table("appointments").delete().eq("id", appointment_id).execute()
-        self._load_appointments_from_db()
+        res = await _db_exec(_APPT_TABLE.delete().eq("id", appointment_id))
+
+        # Drop the deleted row(s) from the slot cache instead of reloading the table
+        for appt in res.data or []:
+            self._slots_cache.pop(appt["date"], None)
+            if appt.get("calendar_event_id"):
+                self._run_in_background(self._delete_calendar_event, appt["calendar_event_id"])
         return "✅ Appointment cancelled successfully."
 
 # ---------------------------------------------------------------------
-# ✅ ✅ ✅ ENTRYPOINT — Traced with @observe
+# ✅ ✅ ✅ ENTRYPOINT — Traced with @_observe
 # ---------------------------------------------------------------------
-@observe(name="livekit_session")
-async def entrypoint(ctx: agents.JobContext):
+def prewarm(proc: agents.JobProcess):
+    """Load the Silero VAD once per worker process, before any job arrives;
+    every session in the process shares it (each opens its own stream)."""
+    proc.userdata["vad"] = silero.VAD.load()
+
+
+# Voice pipeline settings, read from the environment once per worker
+# process rather than on every job
+_STT_KW = {
+    "model": "nova-2",
+    "language": os.getenv("STT_LANGUAGE", "en"),
+    "api_key": os.getenv("DEEPGRAM_API_KEY"),
+}
+_LLM_KW = {
+    "model": os.getenv("LLM_CHOICE", "gemini-2.5-flash"),
+    "api_key": os.getenv("GEMINI_API_KEY"),
+}
+_TTS_KW = {
+    "model": os.getenv("DEEPGRAM_TTS_MODEL", "aura-asteria-en"),
+    "api_key": os.getenv("DEEPGRAM_API_KEY"),
+}
+# Only the minimum is lowered by default; the maximum is how long the turn
+# detector may wait when it thinks the caller isn't done (e.g. spelling a
+# name), so it keeps the library default unless explicitly configured.
+_ENDPOINTING_KW = {"min_endpointing_delay": float(os.getenv("MIN_ENDPOINTING_DELAY", "0.05"))}
+if os.getenv("MAX_ENDPOINTING_DELAY"):
+    _ENDPOINTING_KW["max_endpointing_delay"] = float(os.environ["MAX_ENDPOINTING_DELAY"])
+
+_REALTIME_MODEL = os.getenv("GEMINI_REALTIME_MODEL")
+_REALTIME_KW = {
+    "model": _REALTIME_MODEL,
+    "voice": os.getenv("GEMINI_REALTIME_VOICE", "Puck"),
+    "api_key": os.getenv("GEMINI_API_KEY"),
+}
+
+
+def _realtime_session(ctx: agents.JobContext) -> AgentSession:
+    """Speech-to-speech: one Gemini Live connection replaces STT + LLM + TTS."""
+    return AgentSession(
+        llm=google.beta.realtime.RealtimeModel(**_REALTIME_KW),
+        vad=ctx.proc.userdata["vad"],
+    )
+
 
-    session = AgentSession(
-        stt=deepgram.STT(
-            model="nova-2",
-            language=os.getenv("STT_LANGUAGE", "en"),
-            api_key=os.getenv("DEEPGRAM_API_KEY"),
-        ),
-        llm=google.LLM(
-            model=os.getenv("LLM_CHOICE", "gemini-2.5-flash"),
-            api_key=os.getenv("GEMINI_API_KEY"),
-        ),
-        tts=deepgram.TTS(
-            model=os.getenv("DEEPGRAM_TTS_MODEL", "aura-asteria-en"),
-            api_key=os.getenv("DEEPGRAM_API_KEY"),
-        ),
-        vad=silero.VAD.load(),
+def _pipeline_session(ctx: agents.JobContext) -> AgentSession:
+    """Deepgram STT -> Gemini LLM -> Deepgram TTS cascade."""
+    return AgentSession(
+        stt=deepgram.STT(**_STT_KW),
+        llm=google.LLM(**_LLM_KW),
+        # Deepgram TTS streams over a websocket, so audio starts on the first chunk
+        tts=deepgram.TTS(**_TTS_KW),
+        vad=ctx.proc.userdata["vad"],
+        # End-of-turn from the turn-detector model instead of silence alone,
+        # and start the LLM reply while endpointing is still settling
+        turn_detection=MultilingualModel(),
+        preemptive_generation=True,
+        **_ENDPOINTING_KW,
     )
 
+
+@_observe(name="livekit_session")
+async def entrypoint(ctx: agents.JobContext):
+
+    if _REALTIME_MODEL:
+        session = _realtime_session(ctx)
+    else:
+        session = _pipeline_session(ctx)
+
     await session.start(room=ctx.room, agent=DoctorReceptionist())
 
     await session.generate_reply(
@@ -375,4 +615,4 @@ async def entrypoint(ctx: agents.JobContext):
 # MAIN
 # ---------------------------------------------------------------------
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
+    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
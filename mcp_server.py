@@ -1,43 +1,154 @@
 # mcp_server.py
 from flask import Flask, request, redirect, session, jsonify
+from flask.json.provider import JSONProvider
 import os
+import re
 import json
 import datetime
+import threading
+import time
+from functools import lru_cache, partial
+import orjson
 import google.oauth2.credentials
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
+from googleapiclient.discovery_cache import get_static_doc
+from google.auth.exceptions import RefreshError, TransportError
 from google.auth.transport.requests import Request
 from dotenv import load_dotenv
 
 load_dotenv()
+
+
+class OrjsonProvider(JSONProvider):
+    """Route jsonify() and request.get_json() through orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv("SECRET_KEY", "some_secret_key")
 
+# With REDIS_URL set, keep session data (OAuth state) server-side in Redis;
+# the cookie then only carries a session id. Otherwise Flask's signed cookie.
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    import redis
+    from flask_session import Session
+
+    app.config.update(
+        SESSION_TYPE="redis",
+        SESSION_REDIS=redis.Redis.from_url(REDIS_URL),
+        SESSION_PERMANENT=False,
+    )
+    Session(app)
+
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 CLIENT_SECRETS_FILE = "credentials.json"
 REDIRECT_URI = "http://127.0.0.1:5000/callback"
 TOKEN_FILE = "token.json"
+TOKEN_REFRESH_MARGIN = 300  # seconds before expiry to refresh in the background
+TOKEN_REFRESH_INTERVAL = 60
+TOKEN_REFRESH_TIMEOUT = 10  # seconds for the OAuth refresh call (google-auth default is 120)
+
+# Google caps a Calendar batch request at 50 calls
+MAX_BATCH_EVENTS = 50
+
+# /create-event payload checks, done before any Google API call
+_REQUIRED_EVENT_KEYS = frozenset(("patient_name", "city", "start_time", "end_time"))
+# datetime.isoformat() output: optional fraction and UTC offset (main.py sends +05:00)
+_ISO_DATETIME_RE = re.compile(
+    r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:\d{2})?$"
+)
+
+
+# Parsed token.json, reused until the file's mtime changes. exp_mono is the
+# token expiry on the time.monotonic() clock, so the per-request expiry
+# check is a float compare instead of datetime arithmetic.
+_creds_cache = {"mtime": 0.0, "creds": None, "exp_mono": float("inf")}
+EXPIRY_SKEW = 30  # seconds; refresh inline this close to expiry
+# Guards _creds_cache and token.json across request threads and the refresher.
+# Held only for cache/file work, never across the OAuth network call.
+# Re-entrant because _refresh_and_store() saves while holding it.
+_creds_lock = threading.RLock()
+
+
+def _expiry_monotonic(creds):
+    """Translate creds.expiry (naive UTC) to the monotonic clock; inf if unknown."""
+    if creds.expiry is None:
+        return float("inf")
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return time.monotonic() + (creds.expiry - now).total_seconds()
+
+
+def _copy_credentials(creds):
+    """Independent Credentials with the same fields, safe to refresh off-lock."""
+    copy = google.oauth2.credentials.Credentials(
+        token=creds.token,
+        refresh_token=creds.refresh_token,
+        token_uri=creds.token_uri,
+        client_id=creds.client_id,
+        client_secret=creds.client_secret,
+        scopes=creds.scopes,
+    )
+    copy.expiry = creds.expiry
+    return copy
+
+
+def _refresh_and_store(creds):
+    """Refresh a copy of creds without holding the lock, then swap it in.
+
+    The cached object is never mutated, so services built on it keep working
+    while the refresh is in flight. If token.json was replaced meanwhile
+    (/callback, /logout), the newer state wins and the fresh copy is only
+    returned to the caller.
+    """
+    fresh = _copy_credentials(creds)
+    fresh.refresh(partial(Request(), timeout=TOKEN_REFRESH_TIMEOUT))
+    with _creds_lock:
+        if _creds_cache["creds"] is creds:
+            save_credentials(fresh)
+    return fresh
 
 
 def load_credentials():
     """Load credentials from token.json if exists, else return None."""
-    if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, "r") as f:
-            token_data = json.load(f)
-        creds = google.oauth2.credentials.Credentials(**token_data)
-        # Refresh if expired
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-            # Save refreshed token
-            save_credentials(creds)
-        return creds
-    return None
+    with _creds_lock:
+        try:
+            mtime = os.stat(TOKEN_FILE).st_mtime
+        except FileNotFoundError:
+            _creds_cache["creds"] = None
+            return None
+
+        creds = _creds_cache["creds"]
+        if creds is None or mtime != _creds_cache["mtime"]:
+            with open(TOKEN_FILE, "r") as f:
+                token_data = json.load(f)
+            expiry = token_data.pop("expiry", None)
+            creds = google.oauth2.credentials.Credentials(**token_data)
+            if expiry:
+                creds.expiry = datetime.datetime.fromisoformat(expiry)
+            _creds_cache["creds"] = creds
+            _creds_cache["mtime"] = mtime
+            _creds_cache["exp_mono"] = _expiry_monotonic(creds)
+
+        expired = time.monotonic() > _creds_cache["exp_mono"] - EXPIRY_SKEW
+
+    # Refresh if expired (outside the lock; other requests keep going)
+    if expired and creds.refresh_token:
+        creds = _refresh_and_store(creds)
+    return creds
 
 
 def save_credentials(creds):
-    """Save credentials to token.json"""
+    """Save credentials to token.json (atomically, via a temp file)"""
     token_data = {
         "token": creds.token,
         "refresh_token": creds.refresh_token,
@@ -45,9 +156,76 @@ def save_credentials(creds):
         "client_id": creds.client_id,
         "client_secret": creds.client_secret,
         "scopes": creds.scopes,
+        "expiry": creds.expiry.isoformat() if creds.expiry else None,
     }
-    with open(TOKEN_FILE, "w") as f:
-        json.dump(token_data, f, indent=2)
+    with _creds_lock:
+        # Readers never see a half-written token.json: write aside, then swap in
+        tmp_file = TOKEN_FILE + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(token_data, f, indent=2)
+        os.replace(tmp_file, TOKEN_FILE)
+        _creds_cache["creds"] = creds
+        _creds_cache["mtime"] = os.stat(TOKEN_FILE).st_mtime
+        _creds_cache["exp_mono"] = _expiry_monotonic(creds)
+
+
+def _token_refresher():
+    """Refresh the access token shortly before it expires, off the request path."""
+    while True:
+        time.sleep(TOKEN_REFRESH_INTERVAL)
+        try:
+            creds = load_credentials()
+            if not creds or not creds.refresh_token:
+                continue
+            with _creds_lock:
+                remaining = _creds_cache["exp_mono"] - time.monotonic()
+                due = creds.expiry is None or remaining < TOKEN_REFRESH_MARGIN
+            if due:
+                _refresh_and_store(creds)
+        except (RefreshError, TransportError, OSError, ValueError) as e:
+            print(f"❌ Background token refresh failed: {e}")
+
+
+threading.Thread(target=_token_refresher, name="token-refresher", daemon=True).start()
+
+
+# httplib2.Http (inside each service) is not thread-safe, so keep one
+# Calendar service per worker thread, keyed by the refresh token. A refresh
+# swaps in a new Credentials object, so the entry also remembers which one
+# it was built on and is rebuilt when that changes.
+_service_local = threading.local()
+
+
+# Calendar v3 discovery document bundled with google-api-python-client,
+# read once per process; build_from_document then needs no network or disk.
+_CALENDAR_DISCOVERY_DOC = get_static_doc("calendar", "v3")
+
+
+def get_calendar_service(creds):
+    """Return a cached Calendar v3 service for these credentials."""
+    cache = getattr(_service_local, "services", None)
+    if cache is None:
+        cache = _service_local.services = {}
+    key = creds.refresh_token
+    built_for, service = cache.get(key, (None, None))
+    if built_for is not creds:
+        if _CALENDAR_DISCOVERY_DOC:
+            service = googleapiclient.discovery.build_from_document(
+                _CALENDAR_DISCOVERY_DOC, credentials=creds
+            )
+        else:
+            service = googleapiclient.discovery.build(
+                "calendar", "v3", credentials=creds, cache_discovery=False
+            )
+        cache[key] = (creds, service)
+    return service
+
+
+@lru_cache(maxsize=1)
+def _client_config():
+    """OAuth client config from credentials.json, read once per process."""
+    with open(CLIENT_SECRETS_FILE, "r") as f:
+        return json.load(f)
 
 
 @app.route("/")
@@ -58,16 +236,17 @@ def index():
 @app.route("/logout")
 def logout():
     session.clear()
-    if os.path.exists(TOKEN_FILE):
-        os.remove(TOKEN_FILE)
+    with _creds_lock:
+        if os.path.exists(TOKEN_FILE):
+            os.remove(TOKEN_FILE)
     return "🔄 Session cleared! Please restart the OAuth flow."
 
 
 @app.route("/authorize")
 def authorize():
     """Create OAuth flow and redirect user to Google"""
-    flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE, scopes=SCOPES
+    flow = google_auth_oauthlib.flow.Flow.from_client_config(
+        _client_config(), scopes=SCOPES
     )
     flow.redirect_uri = REDIRECT_URI
 
@@ -91,8 +270,8 @@ def oauth2callback():
         session.clear()
         return "❌ State mismatch! Please restart: /logout"
 
-    flow = google_auth_oauthlib.flow.Flow.from_client_secrets_file(
-        CLIENT_SECRETS_FILE,
+    flow = google_auth_oauthlib.flow.Flow.from_client_config(
+        _client_config(),
         scopes=SCOPES,
         state=session["state"]
     )
@@ -107,16 +286,22 @@ def oauth2callback():
     return "✅ Google Calendar authorized successfully! You can now create events."
 
 
-@app.route("/create-event", methods=["POST"])
-def create_event():
-    creds = load_credentials()
-    if not creds:
-        return jsonify({"error": "Auth missing. Please run /authorize"}), 401
+def _event_error(data):
+    """Return why a create-event payload is invalid, or None if it's fine."""
+    if not isinstance(data, dict):
+        return "Expected a JSON object"
+    missing = _REQUIRED_EVENT_KEYS - data.keys()
+    if missing:
+        return f"Missing fields: {', '.join(sorted(missing))}"
+    for key in ("start_time", "end_time"):
+        if not isinstance(data[key], str) or not _ISO_DATETIME_RE.match(data[key]):
+            return f"{key} must be an ISO-8601 datetime"
+    return None
 
-    service = googleapiclient.discovery.build("calendar", "v3", credentials=creds)
 
-    data = request.get_json()
-    event = {
+def _build_event(data):
+    """Calendar event body for one validated appointment payload."""
+    return {
         "summary": f"Doctor Appointment - {data['patient_name']}",
         "location": data["city"],
         "description": "Doctor consultation appointment.",
@@ -124,6 +309,21 @@ def create_event():
         "end": {"dateTime": data["end_time"], "timeZone": "Asia/Karachi"},
     }
 
+
+@app.route("/create-event", methods=["POST"])
+def create_event():
+    creds = load_credentials()
+    if not creds:
+        return jsonify({"error": "Auth missing. Please run /authorize"}), 401
+
+    data = request.get_json(silent=True)
+    error = _event_error(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    service = get_calendar_service(creds)
+    event = _build_event(data)
+
     result = service.events().insert(calendarId="primary", body=event).execute()
 
     return jsonify({
@@ -132,13 +332,53 @@ def create_event():
         "htmlLink": result["htmlLink"]
     })
 
+
+@app.route("/create-events", methods=["POST"])
+def create_events():
+    """Create several events in one batched HTTP call to Google."""
+    creds = load_credentials()
+    if not creds:
+        return jsonify({"error": "Auth missing. Please run /authorize"}), 401
+
+    data = request.get_json(silent=True)
+    items = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty 'events' list"}), 400
+    if len(items) > MAX_BATCH_EVENTS:
+        return jsonify({"error": f"At most {MAX_BATCH_EVENTS} events per batch"}), 400
+    for i, item in enumerate(items):
+        error = _event_error(item)
+        if error:
+            return jsonify({"error": f"events[{i}]: {error}"}), 400
+
+    service = get_calendar_service(creds)
+    results = [None] * len(items)
+
+    def _on_resp(request_id, response, exception):
+        i = int(request_id)
+        if exception is not None:
+            results[i] = {"error": str(exception)}
+        else:
+            results[i] = {"eventId": response["id"], "htmlLink": response["htmlLink"]}
+
+    batch = service.new_batch_http_request(callback=_on_resp)
+    for i, item in enumerate(items):
+        batch.add(
+            service.events().insert(calendarId="primary", body=_build_event(item)),
+            request_id=str(i),
+        )
+    batch.execute()
+
+    return jsonify({"status": "Batch processed", "results": results})
+
+
 @app.route("/delete-event", methods=["POST"])
 def delete_event():
     creds = load_credentials()
     if not creds:
         return jsonify({"error": "Auth missing. Please run /authorize"}), 401
 
-    service = googleapiclient.discovery.build("calendar", "v3", credentials=creds)
+    service = get_calendar_service(creds)
     data = request.get_json()
 
     event_id = data.get("eventId")
@@ -155,4 +395,9 @@ def delete_event():
 
 
 if __name__ == "__main__":
-    app.run(port=5000, debug=True)
+    # Threaded WSGI server so Google API waits overlap; the Flask dev
+    # server handles one request at a time and forks a reloader.
+    # Alternatively: gunicorn -k gthread -w 2 --threads 8 -b 127.0.0.1:5000 mcp_server:app
+    from waitress import serve
+
+    serve(app, host="127.0.0.1", port=5000, threads=int(os.getenv("MCP_THREADS", "16")))
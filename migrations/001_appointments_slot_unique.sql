@@ -0,0 +1,4 @@
+-- One booking per (city, date, slot). book_appointment relies on the
+-- resulting unique_violation (23505) instead of scanning bookings in Python.
+CREATE UNIQUE INDEX IF NOT EXISTS appointments_slot_uniq
+    ON appointments (lower(city), date, lower(slot));
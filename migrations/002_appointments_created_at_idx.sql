@@ -0,0 +1,4 @@
+-- show_appointments lists the newest bookings first; keep that an index scan.
+ALTER TABLE appointments ADD COLUMN IF NOT EXISTS created_at timestamptz NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS appointments_created_at_idx
+    ON appointments (created_at DESC);
@@ -0,0 +1,5 @@
+-- There is one doctor, so a slot on a given date can only be booked once
+-- regardless of branch. Replaces the per-city index from 001.
+DROP INDEX IF EXISTS appointments_slot_uniq;
+CREATE UNIQUE INDEX IF NOT EXISTS appointments_date_slot_uniq
+    ON appointments (date, slot);
@@ -0,0 +1,19 @@
+-- Atomic booking in one PostgREST call: insert the row unless the
+-- (date, slot) is already taken. An empty result means the slot was booked.
+-- Requires the appointments_date_slot_uniq index from 003.
+CREATE OR REPLACE FUNCTION book_appointment(
+    p_id           appointments.id%TYPE,
+    p_patient_id   appointments.patient_id%TYPE,
+    p_patient_name appointments.patient_name%TYPE,
+    p_city         appointments.city%TYPE,
+    p_date         appointments.date%TYPE,
+    p_slot         appointments.slot%TYPE,
+    p_notes        appointments.notes%TYPE
+) RETURNS SETOF appointments
+LANGUAGE sql
+AS $$
+    INSERT INTO appointments (id, patient_id, patient_name, city, date, slot, notes)
+    VALUES (p_id, p_patient_id, p_patient_name, p_city, p_date, p_slot, p_notes)
+    ON CONFLICT (date, slot) DO NOTHING
+    RETURNING *;
+$$;
@@ -0,0 +1,31 @@
+-- Generate APT/PID ids in Postgres so concurrent agents can't collide and
+-- the agent never has to count rows. Sequences continue after existing ids.
+CREATE SEQUENCE IF NOT EXISTS appt_id_seq;
+CREATE SEQUENCE IF NOT EXISTS patient_id_seq;
+
+SELECT setval('appt_id_seq', COALESCE(
+    (SELECT max(substring(id FROM 4)::int) FROM appointments WHERE id ~ '^APT[0-9]+$'), 1000
+) + 1, false);
+SELECT setval('patient_id_seq', COALESCE(
+    (SELECT max(substring(patient_id FROM 4)::int) FROM appointments WHERE patient_id ~ '^PID[0-9]+$'), 5000
+) + 1, false);
+
+ALTER TABLE appointments ALTER COLUMN id SET DEFAULT 'APT' || nextval('appt_id_seq');
+ALTER TABLE appointments ALTER COLUMN patient_id SET DEFAULT 'PID' || nextval('patient_id_seq');
+
+-- book_appointment no longer takes ids; they come from the column defaults.
+DROP FUNCTION IF EXISTS book_appointment;
+CREATE FUNCTION book_appointment(
+    p_patient_name appointments.patient_name%TYPE,
+    p_city         appointments.city%TYPE,
+    p_date         appointments.date%TYPE,
+    p_slot         appointments.slot%TYPE,
+    p_notes        appointments.notes%TYPE
+) RETURNS SETOF appointments
+LANGUAGE sql
+AS $$
+    INSERT INTO appointments (patient_name, city, date, slot, notes)
+    VALUES (p_patient_name, p_city, p_date, p_slot, p_notes)
+    ON CONFLICT (date, slot) DO NOTHING
+    RETURNING *;
+$$;
@@ -0,0 +1,79 @@
+# tests/test_date_utils.py (pure parsing helpers; no network, no env)
+#
+# Run from the repo root:  python -m unittest discover -s tests
+
+import unittest
+from datetime import date, time
+
+from date_utils import format_db_date, parse_day_to_date, parse_slot_times
+
+
+class ParseDayToDateTests(unittest.TestCase):
+
+    def test_iso(self):
+        self.assertEqual(parse_day_to_date("2025-12-03"), date(2025, 12, 3))
+        self.assertEqual(parse_day_to_date("  2025-12-03  "), date(2025, 12, 3))
+
+    def test_iso_without_zero_padding(self):
+        # strptime("%Y-%m-%d") accepted these; the regex must too
+        self.assertEqual(parse_day_to_date("2025-1-3"), date(2025, 1, 3))
+        self.assertEqual(parse_day_to_date("2025-01-3"), date(2025, 1, 3))
+
+    def test_day_month_year(self):
+        self.assertEqual(parse_day_to_date("03 December 2025"), date(2025, 12, 3))
+        self.assertEqual(parse_day_to_date("3 Dec 2025"), date(2025, 12, 3))
+
+    def test_month_day_year(self):
+        self.assertEqual(parse_day_to_date("December 03 2025"), date(2025, 12, 3))
+        self.assertEqual(parse_day_to_date("Dec 3 2025"), date(2025, 12, 3))
+        self.assertEqual(parse_day_to_date("December 3, 2025"), date(2025, 12, 3))
+        self.assertEqual(parse_day_to_date("december 3 2025"), date(2025, 12, 3))
+
+    def test_weekday_name_is_next_occurrence(self):
+        today = date.today()
+        for i, name in enumerate(("monday", "Wednesday", "SUNDAY")):
+            d = parse_day_to_date(name)
+            self.assertIsNotNone(d)
+            self.assertEqual(d.weekday(), (0, 2, 6)[i])
+            self.assertTrue(0 <= (d - today).days < 7)
+
+    def test_invalid(self):
+        for s in ("", "   ", "tomorrow", "2025-13-01", "2025-02-30", "31 Foo 2025", "12/03/2025"):
+            with self.subTest(s=s):
+                self.assertIsNone(parse_day_to_date(s))
+
+
+class ParseSlotTimesTests(unittest.TestCase):
+
+    def test_canonical_range(self):
+        self.assertEqual(parse_slot_times("10:00 AM - 11:00 AM"), (time(10), time(11)))
+        self.assertEqual(parse_slot_times("12:00 PM - 01:00 PM"), (time(12), time(13)))
+
+    def test_single_time_is_one_hour_slot(self):
+        self.assertEqual(parse_slot_times("4pm"), (time(16), time(17)))
+        self.assertEqual(parse_slot_times("4 PM"), (time(16), time(17)))
+        self.assertEqual(parse_slot_times("4:30 pm"), (time(16, 30), time(17, 30)))
+        self.assertEqual(parse_slot_times("12 AM"), (time(0), time(1)))
+
+    def test_compact_range(self):
+        self.assertEqual(parse_slot_times("4pm-5pm"), (time(16), time(17)))
+
+    def test_24_hour_fallback(self):
+        self.assertEqual(parse_slot_times("16:00"), (time(16), time(17)))
+        self.assertEqual(parse_slot_times("23"), (time(23), time(0)))
+
+    def test_invalid(self):
+        for s in ("", "noon", "13 PM", "4:75 PM", "24:00", "4 PM - 13 PM"):
+            with self.subTest(s=s):
+                self.assertIsNone(parse_slot_times(s))
+
+
+class FormatDbDateTests(unittest.TestCase):
+
+    def test_mm_dd_yy(self):
+        self.assertEqual(format_db_date(date(2025, 1, 3)), "01/03/25")
+        self.assertEqual(format_db_date(date(2009, 12, 31)), "12/31/09")
+
+
+if __name__ == "__main__":
+    unittest.main()